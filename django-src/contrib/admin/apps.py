@@ -1,4 +1,7 @@
 # -*- coding:UTF-8 -*-
+import os
+import sys
+
 from django.apps import AppConfig
 from django.contrib.admin.checks import check_admin_app, check_dependencies
 from django.core import checks
@@ -19,6 +22,18 @@ class SimpleAdminConfig(AppConfig):
 class AdminConfig(SimpleAdminConfig):
     """The default AppConfig for admin which does autodiscovery."""
 
+    # Management commands that never serve the admin; importing every
+    # app's admin.py for them only slows startup. 这些命令跳过自动发现
+    # ('shell' stays out of the set - it's commonly used to poke at
+    # admin.site._registry, which needs discovery to have run)
+    skip_autodiscover_commands = frozenset({
+        'migrate', 'makemigrations', 'collectstatic',
+    })
+
     def ready(self):
         super().ready()
+        if os.environ.get('DJANGO_SKIP_ADMIN_AUTODISCOVER'):
+            return
+        if sys.argv[1:2] and sys.argv[1] in self.skip_autodiscover_commands:
+            return
         self.module.autodiscover()
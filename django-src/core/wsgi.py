@@ -1,8 +1,12 @@
 # -*- coding:UTF-8 -*-
 
 import django
+from django.apps import apps
 from django.core.handlers.wsgi import WSGIHandler
 
+_application = None  # 复用同一个handler, 中间件只加载一次
+
+
 # 返回可调用应用端
 def get_wsgi_application():
     """
@@ -11,5 +15,12 @@ def get_wsgi_application():
     Avoids making django.core.handlers.WSGIHandler a public API, in case the
     internal WSGI implementation changes or moves in the future.
     """
-    django.setup(set_prefix=False)
-    return WSGIHandler()
+    global _application
+    if _application is None:
+        # Worker-reload setups (uWSGI lazy-apps, gunicorn --preload fork
+        # hooks) may call this again after setup already ran; repopulating
+        # the app registry re-imports every app's models for nothing.
+        if not apps.ready:
+            django.setup(set_prefix=False)
+        _application = WSGIHandler()
+    return _application
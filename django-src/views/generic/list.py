@@ -1,15 +1,104 @@
 # -*- coding:UTF-8 -*-
 
+import base64
+import hashlib
+from functools import lru_cache
+
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
 from django.core.paginator import InvalidPage, Paginator
 from django.db.models.query import QuerySet
 from django.http import Http404
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 from django.views.generic.base import ContextMixin, TemplateResponseMixin, View
 
 
+class KeysetPage:
+    """
+    A lightweight page produced by `KeysetPaginator`.
+
+    Exposes `object_list`, `has_next` and `next_token` only; there is no
+    `number` or `num_pages` because keyset pagination never counts rows.
+    """
+    def __init__(self, object_list, key, per_page):
+        self.object_list = object_list[:per_page]
+        self.has_next = len(object_list) > per_page  # 多取一条探测下一页
+        if self.has_next:
+            last_key = getattr(self.object_list[-1], key)
+            self.next_token = base64.urlsafe_b64encode(
+                str(last_key).encode()).decode('ascii')
+        else:
+            self.next_token = None
+
+    def has_other_pages(self):
+        return self.has_next
+
+
+class KeysetPaginator:
+    """
+    Paginate by `WHERE key > last_key LIMIT per_page` on an indexed unique
+    key instead of COUNT(*) + LIMIT/OFFSET, so each page is O(per_page)
+    regardless of table size or offset depth.
+    """
+    def __init__(self, queryset, per_page, key='pk', orphans=0,
+                 allow_empty_first_page=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.key = key
+
+    def page(self, token=None):
+        queryset = self.queryset
+        try:
+            if token:
+                cursor = base64.urlsafe_b64decode(token.encode('ascii')).decode()
+                # filter() coerces the cursor to the key's type right
+                # away, so a decodable-but-garbage cursor raises here.
+                queryset = queryset.filter(**{'%s__gt' % self.key: cursor})
+            object_list = list(queryset.order_by(self.key)[:self.per_page + 1])
+        except (ValueError, UnicodeError):
+            # Covers undecodable tokens as well as values the key type
+            # can't coerce (e.g. a non-numeric cursor against an integer
+            # pk); treat both like an out-of-range page number.
+            raise InvalidPage(_('Invalid cursor token.'))
+        return KeysetPage(object_list, self.key, self.per_page)
+
+
+class CachedCountPaginator(Paginator):
+    """
+    A paginator memoizing the COUNT(*) result in Django's cache, so
+    repeated hits on the same list view skip one full table scan each.
+
+    Invalidation is the caller's business: hook `post_save`/`post_delete`
+    on the queryset's model and delete the key (or just live with a short
+    timeout for counts that may lag slightly).
+    """
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True, cache_timeout=None):
+        super().__init__(object_list, per_page, orphans=orphans,
+                         allow_empty_first_page=allow_empty_first_page)
+        self.cache_timeout = cache_timeout
+
+    @cached_property
+    def count(self):
+        if self.cache_timeout is None or not hasattr(self.object_list, 'query'):
+            return Paginator.count.func(self)
+        key = 'views.generic.list.count.%s' % hashlib.blake2b(
+            str(self.object_list.query).encode()).hexdigest()
+        return cache.get_or_set(
+            key, lambda: Paginator.count.func(self), self.cache_timeout)
+
+
 class MultipleObjectMixin(ContextMixin):
-    """A mixin for views manipulating multiple objects."""
+    """
+    A mixin for views manipulating multiple objects.
+
+    Set `select_related`/`prefetch_related` to eager-load relations the
+    template touches per row and avoid N+1 queries: `select_related` for
+    ForeignKey/OneToOne (a JOIN, one query), `prefetch_related` for M2M
+    and reverse FK (one extra query per relation). Prefetching a huge 1:N
+    relation can cost more than it saves, so pick per field.
+    """
     allow_empty = True  # 若为False,且object_list=0则返回404异常
     queryset = None
     model = None
@@ -17,8 +106,14 @@ class MultipleObjectMixin(ContextMixin):
     paginate_orphans = 0
     context_object_name = None
     paginator_class = Paginator
+    keyset_paginator_class = None  # 设为KeysetPaginator可跳过COUNT(*)
+    count_cache_timeout = None  # 秒数; 设置后COUNT(*)结果走cache
     page_kwarg = 'page'
     ordering = None   # ('a', 'b', 'c', ) format?
+    include_object_list_in_context = True  # False则context只留分页信息
+    select_related = None    # FK/OneToOne预加载, ('a', 'b', ) format
+    prefetch_related = None  # M2M/反向FK预加载
+    page_prefetch = None     # 只对当前页对象做prefetch, IN列表缩到page_size
 
     def get_queryset(self):
         """
@@ -26,6 +121,15 @@ class MultipleObjectMixin(ContextMixin):
 
         The return value must be an iterable and may be an instance of
         `QuerySet` in which case `QuerySet` specific behavior will be enabled.
+
+        When overriding this on top of a queryset that was loaded with
+        `Prefetch()`, call `.all()` on the prefetched relation and filter
+        in Python rather than `.filter(...)`, which issues a fresh query
+        and bypasses the prefetch cache::
+
+            def get_queryset(self):
+                return [f for f in self.list_obj.fighter_set.all()
+                        if not f.archived]
         """
         if self.queryset is not None:
             queryset = self.queryset  # bug? if queryset == 'abc'
@@ -41,11 +145,15 @@ class MultipleObjectMixin(ContextMixin):
                     'cls': self.__class__.__name__
                 }
             )
-        ordering = self.get_ordering()
+        ordering = self._ordering
         if ordering:
             if isinstance(ordering, str):
                 ordering = (ordering,)
             queryset = queryset.order_by(*ordering)
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
 
         return queryset
 
@@ -53,21 +161,60 @@ class MultipleObjectMixin(ContextMixin):
         """Return the field or fields to use for ordering the queryset."""
         return self.ordering
 
+    # View instances are per-request, so the no-arg getters below can be
+    # resolved once and reused internally without re-dispatching.
+    @cached_property
+    def _ordering(self):
+        return self.get_ordering()
+
+    @cached_property
+    def _allow_empty(self):
+        return self.get_allow_empty()
+
+    @cached_property
+    def _paginate_orphans(self):
+        return self.get_paginate_orphans()
+
+    def get_iterator(self, chunk_size=2000, batch_yield_size=500):
+        """
+        Yield the queryset in lists of `batch_yield_size` objects, using
+        `QuerySet.iterator()` underneath so memory stays O(chunk_size)
+        however large the result set is. Meant for CSV/JSON export
+        subclasses that would otherwise call `list(self.object_list)`.
+
+        `iterator()` ignores `prefetch_related`; use `select_related`
+        for FK eager-loading when streaming.
+        """
+        buf = []
+        for obj in self.get_queryset().iterator(chunk_size=chunk_size):
+            buf.append(obj)
+            if len(buf) >= batch_yield_size:
+                yield buf
+                buf = []
+        if buf:
+            yield buf
+
+    def get_paginate_key(self):
+        """Return the unique key the keyset paginator orders by."""
+        return 'pk'
+
     # 分页操作
     def paginate_queryset(self, queryset, page_size):
         """Paginate the queryset, if needed."""
+        if self.keyset_paginator_class is not None:
+            return self.paginate_queryset_by_key(queryset, page_size)
         paginator = self.get_paginator(
-            queryset, page_size, orphans=self.get_paginate_orphans(),
-            allow_empty_first_page=self.get_allow_empty())
+            queryset, page_size, orphans=self._paginate_orphans,
+            allow_empty_first_page=self._allow_empty)
         page_kwarg = self.page_kwarg
         page = self.kwargs.get(page_kwarg) or self.request.GET.get(page_kwarg) or 1
         try:
             page_number = int(page)
         except ValueError:
-            if page == 'last':
-                page_number = paginator.num_pages
-            else:
+            if page != 'last':
+                # Reject before touching num_pages, which costs a COUNT.
                 raise Http404(_("Page is not 'last', nor can it be converted to an int."))
+            page_number = paginator.num_pages
 
         try:
             page = paginator.page(page_number)
@@ -78,6 +225,28 @@ class MultipleObjectMixin(ContextMixin):
                 'message': str(e)
             })
 
+    def paginate_queryset_by_key(self, queryset, page_size):
+        """Paginate by cursor token with `keyset_paginator_class`."""
+        page_kwarg = self.page_kwarg
+        token = self.kwargs.get(page_kwarg) or self.request.GET.get(page_kwarg)
+        if token == 'last':
+            # 只有'last'需要COUNT, 退回普通offset分页器
+            paginator = self.get_paginator(
+                queryset, page_size, orphans=self._paginate_orphans,
+                allow_empty_first_page=self._allow_empty)
+            page = paginator.page(paginator.num_pages)
+            return (paginator, page, page.object_list, page.has_other_pages())
+        paginator = self.keyset_paginator_class(
+            queryset, page_size, key=self.get_paginate_key())
+        try:
+            page = paginator.page(token)
+        except InvalidPage as e:
+            raise Http404(_('Invalid page (%(token)s): %(message)s') % {
+                'token': token,
+                'message': str(e)
+            })
+        return (paginator, page, page.object_list, page.has_other_pages())
+
     def get_paginate_by(self, queryset):  # 不用写queryset吧？
         """
         Get the number of items to paginate by, or ``None`` for no pagination.
@@ -87,6 +256,11 @@ class MultipleObjectMixin(ContextMixin):
     def get_paginator(self, queryset, per_page, orphans=0,
                       allow_empty_first_page=True, **kwargs):
         """Return an instance of the paginator for this view."""
+        if self.count_cache_timeout is not None and self.paginator_class is Paginator:
+            return CachedCountPaginator(
+                queryset, per_page, orphans=orphans,
+                allow_empty_first_page=allow_empty_first_page,
+                cache_timeout=self.count_cache_timeout, **kwargs)
         return self.paginator_class(
             queryset, per_page, orphans=orphans,
             allow_empty_first_page=allow_empty_first_page, **kwargs)
@@ -123,20 +297,31 @@ class MultipleObjectMixin(ContextMixin):
         context_object_name = self.get_context_object_name(queryset)
         if page_size:  # 这里会启动分页器
             paginator, page, queryset, is_paginated = self.paginate_queryset(queryset, page_size)
+            if self.page_prefetch:
+                # Prefetch against the page slice only, so the IN clause
+                # holds page_size ids rather than the whole result set.
+                from django.db.models import prefetch_related_objects
+                queryset = list(queryset)
+                prefetch_related_objects(queryset, *self.page_prefetch)
             context = {
                 'paginator': paginator,
                 'page_obj': page,   # 特定页对象
                 'is_paginated': is_paginated,
-                'object_list': queryset # 特定页面中的全体对象
             }
+            if self.include_object_list_in_context:
+                context['object_list'] = queryset # 特定页面中的全体对象
         else:
             context = {
                 'paginator': None,
                 'page_obj': None,
                 'is_paginated': False,
-                'object_list': queryset # 不分页所有的对象
             }
-        if context_object_name is not None:
+            if self.include_object_list_in_context:
+                context['object_list'] = queryset # 不分页所有的对象
+        # Templates that never touch the rows (AJAX/datatable views where
+        # get_queryset is expensive) can set the flag to False instead of
+        # the old trick of returning queryset.none().
+        if context_object_name is not None and self.include_object_list_in_context:
             context[context_object_name] = queryset
 
         context.update(kwargs)
@@ -147,16 +332,24 @@ class BaseListView(MultipleObjectMixin, View):
     """A base view for displaying a list of objects."""
     def get(self, request, *args, **kwargs):
         self.object_list = self.get_queryset()   # Step1
-        allow_empty = self.get_allow_empty()
+        allow_empty = self._allow_empty
 
-        if not allow_empty: 
-            # When pagination is enabled and object_list is a queryset,
-            # it's better to do a cheap query than to load the unpaginated
-            # queryset in memory.
-            if self.get_paginate_by(self.object_list) is not None and hasattr(self.object_list, 'exists'):
+        if not allow_empty:
+            paginate_by = self.get_paginate_by(self.object_list)
+            if paginate_by is not None \
+                    and hasattr(self.object_list, 'exists'):
+                # When paginating a queryset, a cheap EXISTS query beats
+                # loading the unpaginated queryset into memory.
                 is_empty = not self.object_list.exists()
+            elif hasattr(self.object_list, '__len__'):
+                # bool() fills a queryset's result cache, which the
+                # context/template iteration then reuses - one query,
+                # and object_list stays a QuerySet.
+                is_empty = not self.object_list
             else:
-                is_empty = len(self.object_list) == 0 #分页但是object_list==0
+                # Probe a single item instead of len(), so generic
+                # iterables aren't fully materialized just for a boolean.
+                is_empty = not any(True for _ in zip(range(1), self.object_list))
             if is_empty:  # 获得object_list数量的状态
                 raise Http404(_("Empty list and '%(class_name)s.allow_empty' is False.") % {
                     'class_name': self.__class__.__name__,
@@ -165,6 +358,13 @@ class BaseListView(MultipleObjectMixin, View):
         return self.render_to_response(context)
 
 
+@lru_cache(maxsize=256)
+def _auto_template_name(app_label, model_name, suffix):
+    # Derived name is pure in its inputs, so format it once per
+    # (model, suffix) pair instead of on every request.
+    return '%s/%s%s.html' % (app_label, model_name, suffix)
+
+
 class MultipleObjectTemplateResponseMixin(TemplateResponseMixin):
     """Mixin for responding with a template and list of objects."""
     template_name_suffix = '_list'  # 提供默认模板名
@@ -186,8 +386,9 @@ class MultipleObjectTemplateResponseMixin(TemplateResponseMixin):
         # name list so that user-supplied names override the automatically-
         # generated ones.
         if hasattr(self.object_list, 'model'):
-            opts = self.object_list.model._meta 
-            names.append("%s/%s%s.html" % (opts.app_label, opts.model_name, self.template_name_suffix))
+            opts = self.object_list.model._meta
+            names.append(_auto_template_name(
+                opts.app_label, opts.model_name, self.template_name_suffix))
 
         return names
 
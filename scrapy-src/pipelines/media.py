@@ -1,50 +1,124 @@
 # -*- coding:UTF-8 -*-
 from __future__ import print_function
 
-import functools
 import logging
-from collections import defaultdict
-from twisted.internet.defer import Deferred, DeferredList
-from twisted.python.failure import Failure
 
 from scrapy.settings import Settings
 from scrapy.utils.datatypes import SequenceExclude
-from scrapy.utils.defer import mustbe_deferred, defer_result
-from scrapy.utils.request import request_fingerprint
 from scrapy.utils.misc import arg_to_iter
-from scrapy.utils.log import failure_to_exc_info
 
 logger = logging.getLogger(__name__)
 
 
+_formatted_keys = {}
+
+
+def _format_key(class_name, key):
+    # Pipelines resolve N settings keys per subclass at startup; the
+    # upper-cased prefix and the join are the same every time.
+    try:
+        return _formatted_keys[class_name, key]
+    except KeyError:
+        formatted = _formatted_keys[class_name, key] = \
+            "{}_{}".format(class_name.upper(), key)
+        return formatted
+
+# Deferred machinery is imported on first pipeline instantiation, not at
+# module load: twisted.internet.defer (and scrapy.utils.defer, which also
+# pulls in the reactor) costs megabytes of bytecode that CLI commands not
+# using MediaPipeline shouldn't pay for.
+Deferred = DeferredList = Failure = None
+mustbe_deferred = defer_result = None
+request_fingerprint = failure_to_exc_info = None
+
+
+def _load_deferred_deps():
+    global Deferred, DeferredList, Failure, mustbe_deferred, defer_result, \
+        request_fingerprint, failure_to_exc_info
+    if Deferred is not None:
+        return
+    from twisted.internet import defer as _defer
+    from twisted.python import failure as _failure
+    from scrapy.utils import defer as _scrapy_defer
+    from scrapy.utils.request import request_fingerprint as _fingerprint
+    from scrapy.utils.log import failure_to_exc_info as _to_exc_info
+    Deferred, DeferredList = _defer.Deferred, _defer.DeferredList
+    Failure = _failure.Failure
+    mustbe_deferred = _scrapy_defer.mustbe_deferred
+    defer_result = _scrapy_defer.defer_result
+    request_fingerprint = _fingerprint
+    failure_to_exc_info = _to_exc_info
+
+
 class MediaPipeline(object):
 
     LOG_FAILED_RESULTS = True
 
+    class _Entry(object):
+        """
+        Per-fingerprint bookkeeping record: download state, cached result
+        and the deferreds waiting on it. One dict of these replaces the
+        old `downloading` set / `downloaded` dict / `waiting` defaultdict
+        trio, so each state transition is a single hash lookup.
+        """
+        __slots__ = ('done', 'result', 'waiter_head')
+
+        def __init__(self):
+            self.done = False
+            self.result = None
+            self.waiter_head = Deferred()  # 所有等待者挂在同一条链上
+
+        def add_waiter(self, wad):
+            # Fan the head's eventual result out to this waiter while
+            # leaving the result itself untouched for later waiters, so
+            # resolving K waiters is one pass down a single chain.
+            def fire(result):
+                if isinstance(result, Failure):
+                    wad.errback(result)
+                else:
+                    wad.callback(result)
+                return result
+            self.waiter_head.addBoth(fire)
+
     class SpiderInfo(object):
+        __slots__ = ('spider', 'entries')
+
         def __init__(self, spider):
             self.spider = spider
-            self.downloading = set()  # 跟踪request三种状态
-            self.downloaded = {}
-            self.waiting = defaultdict(list)
+            self.entries = {}  # fp -> _Entry, 单表跟踪request三种状态
 
     def __init__(self, download_func=None, settings=None):
+        _load_deferred_deps()
         self.download_func = download_func
 
         if isinstance(settings, dict) or settings is None:
             settings = Settings(settings)
-        resolve = functools.partial(self._key_for_pipe,
-                                    base_class_name="MediaPipeline",
-                                    settings=settings)
+        # Only one key is resolved here; a partial isn't worth allocating.
         self.allow_redirects = settings.getbool(
-            resolve('MEDIA_ALLOW_REDIRECTS'), False
+            self._key_for_pipe('MEDIA_ALLOW_REDIRECTS',
+                               base_class_name="MediaPipeline",
+                               settings=settings),
+            False
         )
         self._handle_statuses(self.allow_redirects)
+        # Specialize the per-request dispatch once: download_func is fixed
+        # for the pipeline's lifetime, so don't re-test it per request.
+        if download_func is not None:
+            self._download_request = self._download_with_func
+        else:
+            self._download_request = self._download_with_engine
 
     def _handle_statuses(self, allow_redirects):
         self.handle_httpstatus_list = None  # 改变的这里
         if allow_redirects:
             self.handle_httpstatus_list = SequenceExclude(range(300, 400))
+        # Fold the _modify_media_request branch into one (key, value)
+        # pair computed here instead of per request.
+        if self.handle_httpstatus_list:
+            self._media_meta = ('handle_httpstatus_list',
+                                self.handle_httpstatus_list)
+        else:
+            self._media_meta = ('handle_httpstatus_all', True)
 
     def _key_for_pipe(self, key, base_class_name=None,
                       settings=None):
@@ -57,7 +131,7 @@ class MediaPipeline(object):
         'MYPIPE_IMAGES'
         """
         class_name = self.__class__.__name__
-        formatted_key = "{}_{}".format(class_name.upper(), key)
+        formatted_key = _format_key(class_name, key)
         if class_name == base_class_name or not base_class_name \
             or (settings and not settings.get(formatted_key)):
             return key
@@ -86,27 +160,35 @@ class MediaPipeline(object):
     ########################################################### 
     # 网络请求处理部分
     def _process_request(self, request, info):
-        fp = request_fingerprint(request)
+        # Requests reused across items keep their fingerprint in meta, so
+        # the SHA1 over method+url+body runs once per Request object.
+        fp = request.meta.get('_media_fp')
+        if fp is None:
+            fp = request_fingerprint(request)
+            request.meta['_media_fp'] = fp
         cb = request.callback or (lambda _: _)
         eb = request.errback
         request.callback = None
         request.errback = None
 
+        entry = info.entries.get(fp)
+
         # Return cached result if request was already seen
-        if fp in info.downloaded:
-            return defer_result(info.downloaded[fp]).addCallbacks(cb, eb)
+        if entry is not None and entry.done:
+            return defer_result(entry.result).addCallbacks(cb, eb)
 
         # 这里如何运行？
         # Otherwise, wait for result
         wad = Deferred().addCallbacks(cb, eb) # 等待队列
-        info.waiting[fp].append(wad)
 
         # Check if request is downloading right now to avoid doing it twice
-        if fp in info.downloading:
+        if entry is not None:
+            entry.add_waiter(wad)
             return wad
 
         # Download request checking media_to_download hook output first
-        info.downloading.add(fp)
+        info.entries[fp] = entry = self._Entry()
+        entry.add_waiter(wad)
         dfd = mustbe_deferred(self.media_to_download, request, info)
         dfd.addCallback(self._check_media_to_download, request, info)
         dfd.addBoth(self._cache_result_and_execute_waiters, fp, info)
@@ -115,27 +197,25 @@ class MediaPipeline(object):
         )
         return dfd.addBoth(lambda _: wad)  # it must return wad at last
 
-    def _modify_media_request(self, request):  # 这里 
-        if self.handle_httpstatus_list: 
-            request.meta['handle_httpstatus_list'] = self.handle_httpstatus_list
-        else:
-            request.meta['handle_httpstatus_all'] = True
+    def _modify_media_request(self, request):  # 这里
+        key, value = self._media_meta
+        request.meta[key] = value
+
+    def _download_with_func(self, request, info):
+        # this ugly code was left only to support tests. TODO: remove
+        return mustbe_deferred(self.download_func, request, info.spider)
+
+    def _download_with_engine(self, request, info):
+        self._modify_media_request(request) # 为何？
+        return self.crawler.engine.download(request, info.spider)
 
     def _check_media_to_download(self, result, request, info):
         if result is not None:
             return result
-        if self.download_func:
-            # this ugly code was left only to support tests. TODO: remove
-            dfd = mustbe_deferred(self.download_func, request, info.spider)
-            dfd.addCallbacks(
-                callback=self.media_downloaded, callbackArgs=(request, info),
-                errback=self.media_failed, errbackArgs=(request, info))
-        else:
-            self._modify_media_request(request) # 为何？
-            dfd = self.crawler.engine.download(request, info.spider)
-            dfd.addCallbacks(
-                callback=self.media_downloaded, callbackArgs=(request, info),
-                errback=self.media_failed, errbackArgs=(request, info))
+        dfd = self._download_request(request, info)
+        dfd.addCallbacks(
+            callback=self.media_downloaded, callbackArgs=(request, info),
+            errback=self.media_failed, errbackArgs=(request, info))
         return dfd
     
     # 缓存结果
@@ -145,10 +225,14 @@ class MediaPipeline(object):
             result.cleanFailure()
             result.frames = []
             result.stack = None
-        info.downloading.remove(fp)
-        info.downloaded[fp] = result  # cache result
-        for wad in info.waiting.pop(fp):
-            defer_result(result).chainDeferred(wad)
+        entry = info.entries[fp]
+        entry.done = True
+        entry.result = result  # cache result
+        head, entry.waiter_head = entry.waiter_head, None
+        # the fan-out callbacks pass failures through untouched, so
+        # swallow the terminal one or twisted logs it as unhandled at GC
+        head.addErrback(lambda _: None)
+        defer_result(result).chainDeferred(head)  # 一次resolve全部等待者
 
     ########################################################### 
 
@@ -172,7 +256,9 @@ class MediaPipeline(object):
 
     def item_completed(self, results, item, info):
         """Called per item when all media requests has been processed"""
-        if self.LOG_FAILED_RESULTS:
+        # all() scans the tuples at C speed; only walk in Python when
+        # there is actually something to log (failures are the rare case).
+        if self.LOG_FAILED_RESULTS and not all(ok for ok, _ in results):
             for ok, value in results:
                 if not ok:
                     logger.error(
@@ -14,7 +14,10 @@ import os
 import shutil
 import time
 import re
+import copy_reg
 import collections
+from itertools import product
+from urllib import quote
 
 from ._image import ImageContainer
 
@@ -36,11 +39,17 @@ from quodlibet.util.tags import STANDARD_TAGS as USEFUL_TAGS
 from quodlibet.util.tags import MACHINE_TAGS
 
 
-MIGRATE = frozenset(("~#playcount ~#laststarted ~#lastplayed ~#added "
+# Tag names below are interned: they come back as fresh str objects from
+# the parsers, and interned keys let dict lookups hit the identity check
+# instead of a per-character compare.
+
+MIGRATE = frozenset(intern(k) for k in
+          ("~#playcount ~#laststarted ~#lastplayed ~#added "
            "~#skipcount ~#rating ~bookmark").split())
 
-PEOPLE = ("albumartist artist author composer ~performers originalartist "
-          "lyricist arranger conductor").split()
+PEOPLE = [intern(k) for k in
+          ("albumartist artist author composer ~performers originalartist "
+          "lyricist arranger conductor").split()]
 
 TAG_ROLES = {
     "composer": _("Composition"),
@@ -50,21 +59,47 @@ TAG_ROLES = {
 }
 
 TAG_TO_SORT = {
-    "artist": "artistsort",
-    "album": "albumsort",
-    "albumartist": "albumartistsort",
-    "performer": "performersort",
-    "~performers": "~performerssort"
+    intern("artist"): intern("artistsort"),
+    intern("album"): intern("albumsort"),
+    intern("albumartist"): intern("albumartistsort"),
+    intern("performer"): intern("performersort"),
+    intern("~performers"): intern("~performerssort")
 }
 
-INTERN_NUM_DEFAULT = frozenset("~#lastplayed ~#laststarted ~#playcount "
+INTERN_NUM_DEFAULT = frozenset(intern(k) for k in
+    "~#lastplayed ~#laststarted ~#playcount "
     "~#skipcount ~#length ~#bitrate ~#filesize".split())
 
 SORT_TO_TAG = dict([(v, k) for (k, v) in TAG_TO_SORT.iteritems()])
 
 PEOPLE_SORT = [TAG_TO_SORT.get(k, k) for k in PEOPLE]
 
-FILESYSTEM_TAGS = "~filename ~basename ~dirname".split()
+FILESYSTEM_TAGS = [intern(k) for k in "~filename ~basename ~dirname".split()]
+
+_URL_PREFIXES = ("http://", "https://", "www.")
+
+_NUMTYPES = (int, long, float)
+
+# Which memoized human_sort_key entries a tag write invalidates; the
+# sort tags fall back to their plain counterparts, so both count as
+# dependencies.
+_HUMAN_DEPS = {
+    "artistsort": ("~~h_artistsort",),
+    "artist": ("~~h_artistsort",),
+    "albumsort": ("~~h_albumsort",),
+    "album": ("~~h_albumsort",),
+    "albumartistsort": ("~~h_albumartistsort",),
+    "albumartist": ("~~h_albumartistsort",),
+    "title": ("~~h_title",),
+}
+
+# quote() leaves these alone, so only bytes > 127 get %-escaped -- the
+# search-URL builder inserts its own '+' and '%22' that must survive.
+_ASCII_SAFE = "".join(chr(i) for i in xrange(32, 127))
+
+# sort_by_func closures, keyed by tag string; rebuilt sort functions for
+# the same column are identical, so reuse them across sorts.
+_SORT_BY_FUNCS = {}
 
 
 class AudioFile(dict, ImageContainer):
@@ -91,24 +126,66 @@ class AudioFile(dict, ImageContainer):
     format = "Unknown Audio File"
     mimes = []
 
-    @util.cached_property
+    # While "~~stat_clean" is present, sanitize(trust_stat=True) may
+    # trust the cached ~#mtime/~#filesize instead of re-stat()ing;
+    # rename/reload drop it to force the next stat. Living in the tag
+    # dict (like the sort caches below) keeps songs free of a per
+    # instance __dict__.
+
+    # The sort caches live inside the tag dict itself under "~~" keys
+    # rather than in __dict__, so plain songs never allocate a per
+    # instance attribute dict. Everything iterating raw keys treats
+    # "~~"-prefixed entries as internal and skips them; note that
+    # len(song) and raw dict comparisons see the extra entries once
+    # the caches populate.
+
+    def __human(self, tag):
+        """Memoized human_sort_key of a sort tag; survives unrelated tag
+        edits so key-cache rebuilds skip the regex/normalization cost."""
+        hkey = "~~h_" + tag
+        try:
+            return dict.__getitem__(self, hkey)
+        except KeyError:
+            if tag == "title":
+                value = human(self.get("title", ""))
+            else:
+                value = human(self(tag))
+            dict.__setitem__(self, hkey, value)
+            return value
+
+    @property
     def __song_key(self):
-        return (self("~#disc"), self("~#track"),
-            human(self("artistsort")),
-            self.get("musicbrainz_artistid", ""),
-            human(self.get("title", "")),
-            self.get("~filename"))
+        try:
+            return dict.__getitem__(self, "~~songkey")
+        except KeyError:
+            value = (self("~#disc"), self("~#track"),
+                self.__human("artistsort"),
+                self.get("musicbrainz_artistid", ""),
+                self.__human("title"),
+                self.get("~filename"))
+            dict.__setitem__(self, "~~songkey", value)
+            return value
 
-    @util.cached_property
+    @property
     def album_key(self):
-        return (human(self("albumsort", "")),
-                human(self("albumartistsort", "")),
-                self.get("album_grouping_key") or self.get("labelid") or
-                self.get("musicbrainz_albumid") or "")
+        try:
+            return dict.__getitem__(self, "~~albumkey")
+        except KeyError:
+            value = (self.__human("albumsort"),
+                    self.__human("albumartistsort"),
+                    self.get("album_grouping_key") or self.get("labelid") or
+                    self.get("musicbrainz_albumid") or "")
+            dict.__setitem__(self, "~~albumkey", value)
+            return value
 
-    @util.cached_property
+    @property
     def sort_key(self):
-        return [self.album_key, self.__song_key]
+        try:
+            return dict.__getitem__(self, "~~sortkey")
+        except KeyError:
+            value = [self.album_key, self.__song_key]
+            dict.__setitem__(self, "~~sortkey", value)
+            return value
 
     @staticmethod
     def sort_by_func(tag):
@@ -118,14 +195,22 @@ class AudioFile(dict, ImageContainer):
             return song.sort_key[1][2]
 
         if callable(tag):
+            # Not hashable-stable; don't cache.
             return lambda song: human(tag(song))
-        elif tag == "artistsort":
-            return artist_sort
+        try:
+            return _SORT_BY_FUNCS[tag]
+        except KeyError:
+            pass
+        if tag == "artistsort":
+            func = artist_sort
         elif tag in FILESYSTEM_TAGS:
-            return lambda song: fsdecode(song(tag), note=False)
+            func = lambda song: fsdecode(song(tag), note=False)
         elif tag.startswith("~#") and "~" not in tag[2:]:
-            return lambda song: song(tag)
-        return lambda song: human(song(tag))
+            func = lambda song: song(tag)
+        else:
+            func = lambda song: human(song(tag))
+        _SORT_BY_FUNCS[tag] = func
+        return func
 
     def __getstate__(self):
         """Don't pickle anything from __dict__"""
@@ -135,23 +220,44 @@ class AudioFile(dict, ImageContainer):
         """Needed because we have defined getstate"""
         pass
 
+    def __reduce__(self):
+        # __getstate__ only covers __dict__; at protocol 1 the base dict
+        # payload is pickled regardless, which would write the "~~" sort
+        # caches into library files - bloating them and, worse, letting
+        # stale cached keys be trusted on load (dict.__init__ restores
+        # the payload without going through __setitem__, so invalidation
+        # never runs). Strip them here; they are cheap to recompute.
+        payload = dict(
+            (k, v) for k, v in self.iteritems() if k[:2] != "~~")
+        return (copy_reg._reconstructor,
+                (self.__class__, dict, payload), None)
+
+    # In __setitem__/__delitem__ the common bulk-import case is "no sort
+    # cache built yet": membership tests only, no dict mutation at all.
+
     def __setitem__(self, key, value):
+        # add/change/from_dump all funnel through here, so every stored
+        # str key ends up interned.
+        if type(key) is str:
+            key = intern(key)
         dict.__setitem__(self, key, value)
-        if not self.__dict__:
-            return
-        pop = self.__dict__.pop
-        pop("album_key", None)
-        pop("sort_key", None)
-        pop("__song_key", None)
+        if "~~sortkey" in self or "~~albumkey" in self or "~~songkey" in self:
+            pop = self.pop
+            pop("~~albumkey", None)
+            pop("~~sortkey", None)
+            pop("~~songkey", None)
+        for hkey in _HUMAN_DEPS.get(key, ()):
+            self.pop(hkey, None)
 
     def __delitem__(self, key):
         dict.__delitem__(self, key)
-        if not self.__dict__:
-            return
-        pop = self.__dict__.pop
-        pop("album_key", None)
-        pop("sort_key", None)
-        pop("__song_key", None)
+        if "~~sortkey" in self or "~~albumkey" in self or "~~songkey" in self:
+            pop = self.pop
+            pop("~~albumkey", None)
+            pop("~~sortkey", None)
+            pop("~~songkey", None)
+        for hkey in _HUMAN_DEPS.get(key, ()):
+            self.pop(hkey, None)
 
     @property
     def key(self):
@@ -187,6 +293,7 @@ class AudioFile(dict, ImageContainer):
         """Reload an audio file from disk. The caller is responsible for
         handling any errors."""
 
+        self.pop("~~stat_clean", None)
         fn = self["~filename"]
         saved = {}
         for key in self:
@@ -201,7 +308,7 @@ class AudioFile(dict, ImageContainer):
         """Returns a list of keys that are not internal, i.e. they don't
         have '~' in them."""
 
-        return filter(lambda s: s[:1] != "~", self.keys())
+        return [s for s in self if s and s[0] != "~"]
 
     def __call__(self, key, default=u"", connector=" - "):
         """Return a key, synthesizing it if necessary. A default value
@@ -213,112 +320,33 @@ class AudioFile(dict, ImageContainer):
 
         For details on tied tags, see the documentation for util.tagsplit."""
 
+        # Fast path: most calls are plain tags (artist, album, ...) that
+        # end in the final dict.get anyway; skip the cold branches.
+        if key and key[0] != "~" and key != "title" and key not in SORT_TO_TAG:
+            return dict.get(self, key, default)
+
         if key[:1] == "~":
             key = key[1:]
             if "~" in key:
                 # FIXME: decode ~filename etc.
                 if not isinstance(default, basestring):
                     return default
-                return connector.join(
-                    filter(None,
-                    map(lambda x: isinstance(x, basestring) and x or str(x),
-                    map(lambda x: (isinstance(x, float) and "%.2f" % x) or x,
-                    map(self.__call__, util.tagsplit("~" + key)))))) or default
-            elif key == "#track":
-                try:
-                    return int(self["tracknumber"].split("/")[0])
-                except (ValueError, TypeError, KeyError):
-                    return default
-            elif key == "#disc":
-                try:
-                    return int(self["discnumber"].split("/")[0])
-                except (ValueError, TypeError, KeyError):
-                    return default
-            elif key == "length":
-                length = self.get("~#length")
-                if length is None:
-                    return default
-                else:
-                    return util.format_time(length)
-            elif key == "#rating":
-                return dict.get(self, "~" + key, config.RATINGS.default)
-            elif key == "rating":
-                return util.format_rating(self("~#rating"))
-            elif key == "people" or key == "people:roles":
-                return (self._role_call(key, PEOPLE, "performer", True)
-                        or default)
-            elif key == "peoplesort" or key == "peoplesort:roles":
-                # Ignores non-sort tags if there are any sort tags (e.g. just
-                # returns "B" for {artist=A, performersort=B}).
-                # TODO: figure out the "correct" behavior for mixed sort tags
-                return (self._role_call(key, PEOPLE_SORT, "performersort",
-                                        True)
-                        or self("~" + key.replace("sort", ""),
-                                default, connector))
-            elif (key == "performers" or key == "performer" or
-                    key == "performers:roles" or key == "performer:roles"):
-                return (self._role_call(key,
-                                        prefixed("performer", self.keys()),
-                                        "performer")
-                        or default)
-            elif (key == "performerssort" or key == "performersort" or
-                  key == "performerssort:roles" or
-                  key == "performersort:roles"):
-                return (self._role_call(key,
-                                        prefixed("performersort", self.keys()),
-                                        "performersort")
-                        or self("~" + key.replace("sort", ""), default,
-                                connector))
-            elif key == "basename":
-                return os.path.basename(self["~filename"]) or self["~filename"]
-            elif key == "dirname":
-                return os.path.dirname(self["~filename"]) or self["~filename"]
-            elif key == "uri":
-                try:
-                    return self["~uri"]
-                except KeyError:
-                    return URI.frompath(self["~filename"])
-            elif key == "format":
-                return self.get("~format", self.format)
-            elif key == "year":
-                return self.get("date", default)[:4]
-            elif key == "#year":
-                try:
-                    return int(self.get("date", default)[:4])
-                except (ValueError, TypeError, KeyError):
-                    return default
-            elif key == "originalyear":
-                return self.get("originaldate", default)[:4]
-            elif key == "#originalyear":
-                try:
-                    return int(self.get("originaldate", default)[:4])
-                except (ValueError, TypeError, KeyError):
-                    return default
-            elif key == "#tracks":
-                try:
-                    return int(self["tracknumber"].split("/")[1])
-                except (ValueError, IndexError, TypeError, KeyError):
-                    return default
-            elif key == "#discs":
-                try:
-                    return int(self["discnumber"].split("/")[1])
-                except (ValueError, IndexError, TypeError, KeyError):
-                    return default
-            elif key == "lyrics":
-                try:
-                    fileobj = file(self.lyric_filename, "rU")
-                except EnvironmentError:
-                    return default
-                else:
-                    return fileobj.read().decode("utf-8", "replace")
-            elif key == "filesize":
-                return util.format_size(self("~#filesize", 0))
-            elif key == "playlists":
-                # See Issue 876
-                # Avoid circular references from formats/__init__.py
-                from quodlibet.util.collection import Playlist
-                playlists = Playlist.playlists_featuring(self)
-                return "\n".join([s.name for s in playlists]) or default
+                # One explicit loop instead of three stacked map/lambda
+                # layers; avoids the per-value lambda frames and the
+                # intermediate lists.
+                parts = []
+                for tag in util.tagsplit("~" + key):
+                    v = self(tag)
+                    if isinstance(v, float):
+                        v = "%.2f" % v
+                    elif not isinstance(v, basestring):
+                        v = str(v)
+                    if v:
+                        parts.append(v)
+                return connector.join(parts) or default
+            handler = _CALL_HANDLERS.get(key)
+            if handler is not None:
+                return handler(self, default, connector)
             elif key.startswith("#replaygain_"):
                 try:
                     val = self.get(key[1:], default)
@@ -364,9 +392,11 @@ class AudioFile(dict, ImageContainer):
     def _roles(self, tag):
         """Returns a defaultdict of name => [role, ...]."""
         roles = collections.defaultdict(list)
-        for key in self.keys():
-            if key.startswith(tag + ":"):
-                role = util.title(key[1 + len(tag):])
+        prefix = tag + ":"
+        plen = len(prefix)
+        for key in self:  # plain dict iteration, no list copy
+            if key.startswith(prefix):
+                role = util.title(key[plen:])
                 for name in self.list(key):
                     roles[name].append(role)
         for name in self.list(tag):
@@ -427,7 +457,7 @@ class AudioFile(dict, ImageContainer):
             v = self(key, u"")
         else:
             v = self.get(key, u"")
-        if isinstance(v, (int, long, float)):
+        if isinstance(v, _NUMTYPES):
             return v
         else:
             return v.replace("\n", ", ")
@@ -439,30 +469,40 @@ class AudioFile(dict, ImageContainer):
         An empty synthetic tag cannot be distinguished from a non-existent
         synthetic tag; both result in []."""
 
-        if "~" in key or key == "title":
+        if key[:1] == "~" or key == "title":
             v = self(key, connector="\n")
             if v == "":
                 return []
+            elif "\n" not in v:
+                return [v]
             else:
                 return v.split("\n")
         else:
             v = self.get(key)
-            return [] if v is None else v.split("\n")
+            if v is None:
+                return []
+            elif "\n" not in v:
+                return [v]
+            else:
+                return v.split("\n")
 
     def list_separate(self, key, connector=" - "):
         """Similar to list, but will return a list of all combinations
         for tied tags instead of one comma separated string"""
         if key[:1] == "~" and "~" in key[1:]:
-            vals = \
-                filter(None,
-                map(lambda x: isinstance(x, basestring) and x or str(x),
-                map(lambda x: (isinstance(x, float) and "%.2f" % x) or x,
-                (self(tag) for tag in util.tagsplit(key)))))
-            vals = (val.split("\n") for val in vals)
-            r = [[]]
-            for x in vals:
-                r = [i + [y] for y in x for i in r]
-            return map(connector.join, r)
+            vals = []
+            for tag in util.tagsplit(key):
+                v = self(tag)
+                if isinstance(v, float):
+                    v = "%.2f" % v
+                elif not isinstance(v, basestring):
+                    v = str(v)
+                if v:
+                    vals.append(v)
+            # C-level Cartesian product; the old fold rebuilt every
+            # partial combination list per step.
+            split_vals = [val.split("\n") for val in vals]
+            return [connector.join(combo) for combo in product(*split_vals)]
         else:
             return self.list(key)
 
@@ -476,6 +516,8 @@ class AudioFile(dict, ImageContainer):
         merged = AudioFile()
         text = {}
         for key, value in self.iteritems():
+            if key[:2] == "~~":  # internal sort caches
+                continue
             lower = key.lower()
             if key.startswith("~#"):
                 merged[lower] = value
@@ -541,6 +583,7 @@ class AudioFile(dict, ImageContainer):
         elif normalize_path(newname, canonicalise=True) != self['~filename']:
             raise ValueError
 
+        self.pop("~~stat_clean", None)
         self.sanitize(newname)
 
     def website(self):
@@ -551,37 +594,42 @@ class AudioFile(dict, ImageContainer):
             return self.list("website")[0]
         for cont in self.list("contact") + self.list("comment"):
             c = cont.lower()
-            if (c.startswith("http://") or c.startswith("https://") or
-                    c.startswith("www.")):
+            if c.startswith(_URL_PREFIXES):
                 return cont
             elif c.startswith("//www."):
                 return "http:" + cont
         else:
             text = "http://www.google.com/search?q="
-            esc = lambda c: ord(c) > 127 and '%%%x' % ord(c) or c
             if "labelid" in self:
-                text += ''.join(map(esc, self["labelid"]))
+                text += quote(encode(self["labelid"]), safe=_ASCII_SAFE)
             else:
                 artist = util.escape("+".join(self("artist").split()))
                 album = util.escape("+".join(self("album").split()))
                 artist = encode(artist)
                 album = encode(album)
-                artist = "%22" + ''.join(map(esc, artist)) + "%22"
-                album = "%22" + ''.join(map(esc, album)) + "%22"
+                artist = "%22" + quote(artist, safe=_ASCII_SAFE) + "%22"
+                album = "%22" + quote(album, safe=_ASCII_SAFE) + "%22"
                 text += artist + "+" + album
             text += "&ie=UTF8"
             return text
 
-    def sanitize(self, filename=None):
+    def sanitize(self, filename=None, trust_stat=False):
         """Fill in metadata defaults. Find ~mountpoint, ~#mtime, ~#filesize
-        and ~#added. Check for null bytes in tags."""
+        and ~#added. Check for null bytes in tags.
+
+        With trust_stat, a song statted before and untouched since (no
+        rename/reload) keeps its cached ~#mtime/~#filesize.
+        """
 
-        # Replace nulls with newlines, trimming zero-length segments
+        # Replace nulls with newlines, trimming zero-length segments.
+        # The '\0' in val test keeps the 99% no-null case a single
+        # C-level scan; only then do we split and drop empties.
         for key, val in self.items():
-            if isinstance(val, basestring) and '\0' in val:
-                self[key] = '\n'.join(filter(lambda s: s, val.split('\0')))
+            if isinstance(val, basestring):
+                if '\0' in val:
+                    self[key] = '\n'.join(s for s in val.split('\0') if s)
             # Remove unnecessary defaults
-            if key in INTERN_NUM_DEFAULT and val == 0:
+            elif key in INTERN_NUM_DEFAULT and val == 0:
                 del self[key]
 
         if filename:
@@ -606,11 +654,20 @@ class AudioFile(dict, ImageContainer):
         # Fill in necessary values.
         self.setdefault("~#added", int(time.time()))
 
+        # Callers that know the file on disk is unchanged may opt in to
+        # trusting the cached values; a dict get beats a syscall per
+        # song there. The plain no-filename call stays a refresh, since
+        # every format's write() uses it to pick up the new mtime/size.
+        if (trust_stat and filename is None
+                and "~~stat_clean" in self and self.get("~#mtime")):
+            return
+
         # For efficiency, do a single stat here. See Issue 504
         try:
             stat = os.stat(self['~filename'])
             self["~#mtime"] = stat.st_mtime
             self["~#filesize"] = stat.st_size
+            dict.__setitem__(self, "~~stat_clean", True)
 
             # Issue 342. This is a horrible approximation (due to headers) but
             # on FLACs, the most common case, this should be close enough
@@ -629,12 +686,19 @@ class AudioFile(dict, ImageContainer):
         s = []
         for k in self.keys():
             k = str(k)
-            if isinstance(self[k], int) or isinstance(self[k], long):
-                s.append("%s=%d" % (k, self[k]))
-            elif isinstance(self[k], float):
-                s.append("%s=%f" % (k, self[k]))
+            if k[:2] == "~~":  # internal sort caches
+                continue
+            v = self[k]
+            # Exact type tests; tag values are plain int/long/float/str.
+            t = type(v)
+            if t is int or t is long:
+                s.append("%s=%d" % (k, v))
+            elif t is float:
+                s.append("%s=%f" % (k, v))
             else:
-                for v2 in self.list(k):
+                # Values are multi-line strings already; split inline
+                # rather than re-dispatching through self.list().
+                for v2 in v.split("\n"):
                     if isinstance(v2, str):
                         s.append("%s=%s" % (k, v2))
                     else:
@@ -649,12 +713,15 @@ class AudioFile(dict, ImageContainer):
 
     def from_dump(self, text):
         """Parses the text created with to_dump and adds the found tags."""
+        # Buffer repeated string keys and join once per key; appending to
+        # the stored string per line is quadratic in the value count.
+        pending = {}
         for line in text.split("\n"):
             if not line:
                 continue
-            parts = line.split("=")
-            key = parts[0]
-            val = "=".join(parts[1:])
+            key, sep, val = line.partition("=")
+            if not sep:
+                continue
             if key == "~format":
                 pass
             elif key.startswith("~#"):
@@ -666,7 +733,9 @@ class AudioFile(dict, ImageContainer):
                     except ValueError:
                         pass
             else:
-                self.add(key, val)
+                pending.setdefault(key, []).append(val)
+        for key, vals in pending.iteritems():
+            self.addmany(key, vals)
 
     def change(self, key, old_value, new_value):
         """Change 'old_value' to 'new_value' for the given metadata key.
@@ -689,6 +758,16 @@ class AudioFile(dict, ImageContainer):
         else:
             self[key] += "\n" + value
 
+    def addmany(self, key, values):
+        """Add several values for the given metadata key with one join,
+        instead of growing the stored string once per value."""
+        values = list(values)
+        if not values:
+            return
+        if key in self:
+            values.insert(0, self[key])
+        self[key] = "\n".join(values)
+
     def remove(self, key, value):
         """Remove a value from the given key; if the value is not found,
         remove all values for that key."""
@@ -720,7 +799,7 @@ class AudioFile(dict, ImageContainer):
         used when the song does not have replaygain information.
         """
         for profile in profiles:
-            if profile is "none":
+            if profile == "none":
                 return 1.0
             try:
                 db = float(self["replaygain_%s_gain" % profile].split()[0])
@@ -728,11 +807,7 @@ class AudioFile(dict, ImageContainer):
             except (KeyError, ValueError, IndexError):
                 continue
             else:
-                db += pre_amp_gain
-                scale = 10. ** (db / 20)
-                if scale * peak > 1:
-                    scale = 1.0 / peak  # don't clip
-                return min(15, scale)
+                return _replay_gain_scale(db + pre_amp_gain, peak)
         else:
             scale = 10. ** ((fallback_gain + pre_amp_gain) / 20)
             if scale > 1:
@@ -796,9 +871,201 @@ DUMMY_SONG = AudioFile({
 })
 
 
+def _replay_gain_scale(db, peak):
+    """Pure arithmetic kernel of replay_gain, kept separate so
+    library-wide normalization sweeps don't repeat the clip logic
+    inline per call site."""
+    scale = 10. ** (db / 20)
+    if scale * peak > 1:
+        scale = 1.0 / peak  # don't clip
+    return min(15, scale)
+
+
 def role_desc(name, roles):
     return name if not roles else "%s (%s)" % (name, ", ".join(sorted(roles)))
 
 
 def prefixed(prefix, strings):
-    return filter(lambda s: s == prefix or s.startswith(prefix + ":"), strings)
+    subprefix = prefix + ":"
+    return [s for s in strings if s == prefix or s.startswith(subprefix)]
+
+
+# Synthetic tag dispatch for __call__. A single dict lookup replaces the
+# old ~25-test if/elif chain; handlers are plain module functions taking
+# (song, default, connector) so no bound method is allocated per call.
+
+def _track(song, default, connector):
+    try:
+        return int(song["tracknumber"].split("/")[0])
+    except (ValueError, TypeError, KeyError):
+        return default
+
+
+def _disc(song, default, connector):
+    try:
+        return int(song["discnumber"].split("/")[0])
+    except (ValueError, TypeError, KeyError):
+        return default
+
+
+def _tracks(song, default, connector):
+    try:
+        return int(song["tracknumber"].split("/")[1])
+    except (ValueError, IndexError, TypeError, KeyError):
+        return default
+
+
+def _discs(song, default, connector):
+    try:
+        return int(song["discnumber"].split("/")[1])
+    except (ValueError, IndexError, TypeError, KeyError):
+        return default
+
+
+def _length(song, default, connector):
+    length = song.get("~#length")
+    if length is None:
+        return default
+    else:
+        return util.format_time(length)
+
+
+def _num_rating(song, default, connector):
+    return dict.get(song, "~#rating", config.RATINGS.default)
+
+
+def _rating(song, default, connector):
+    return util.format_rating(song("~#rating"))
+
+
+def _make_people(key):
+    def people(song, default, connector):
+        return song._role_call(key, PEOPLE, "performer", True) or default
+    return people
+
+
+def _make_peoplesort(key):
+    fallback = "~" + key.replace("sort", "")
+
+    def peoplesort(song, default, connector):
+        # Ignores non-sort tags if there are any sort tags (e.g. just
+        # returns "B" for {artist=A, performersort=B}).
+        # TODO: figure out the "correct" behavior for mixed sort tags
+        return (song._role_call(key, PEOPLE_SORT, "performersort", True)
+                or song(fallback, default, connector))
+    return peoplesort
+
+
+def _make_performers(key):
+    def performers(song, default, connector):
+        return (song._role_call(key, prefixed("performer", song),
+                                "performer")
+                or default)
+    return performers
+
+
+def _make_performerssort(key):
+    fallback = "~" + key.replace("sort", "")
+
+    def performerssort(song, default, connector):
+        return (song._role_call(key, prefixed("performersort", song),
+                                "performersort")
+                or song(fallback, default, connector))
+    return performerssort
+
+
+def _basename(song, default, connector):
+    return os.path.basename(song["~filename"]) or song["~filename"]
+
+
+def _dirname(song, default, connector):
+    return os.path.dirname(song["~filename"]) or song["~filename"]
+
+
+def _uri(song, default, connector):
+    try:
+        return song["~uri"]
+    except KeyError:
+        return URI.frompath(song["~filename"])
+
+
+def _format(song, default, connector):
+    return song.get("~format", song.format)
+
+
+def _year(song, default, connector):
+    # Slice the stored date, not the default, which may not be a string.
+    return dict.get(song, "date", "")[:4] or default
+
+
+def _num_year(song, default, connector):
+    try:
+        return int(dict.get(song, "date", "")[:4])
+    except (ValueError, TypeError):
+        return default
+
+
+def _originalyear(song, default, connector):
+    return dict.get(song, "originaldate", "")[:4] or default
+
+
+def _num_originalyear(song, default, connector):
+    try:
+        return int(dict.get(song, "originaldate", "")[:4])
+    except (ValueError, TypeError):
+        return default
+
+
+def _lyrics(song, default, connector):
+    try:
+        fileobj = file(song.lyric_filename, "rU")
+    except EnvironmentError:
+        return default
+    else:
+        return fileobj.read().decode("utf-8", "replace")
+
+
+def _filesize(song, default, connector):
+    return util.format_size(song("~#filesize", 0))
+
+
+def _playlists(song, default, connector):
+    # See Issue 876
+    # Avoid circular references from formats/__init__.py
+    from quodlibet.util.collection import Playlist
+    playlists = Playlist.playlists_featuring(song)
+    return "\n".join([s.name for s in playlists]) or default
+
+
+_CALL_HANDLERS = {
+    "#track": _track,
+    "#disc": _disc,
+    "#tracks": _tracks,
+    "#discs": _discs,
+    "length": _length,
+    "#rating": _num_rating,
+    "rating": _rating,
+    "people": _make_people("people"),
+    "people:roles": _make_people("people:roles"),
+    "peoplesort": _make_peoplesort("peoplesort"),
+    "peoplesort:roles": _make_peoplesort("peoplesort:roles"),
+    "performer": _make_performers("performer"),
+    "performers": _make_performers("performers"),
+    "performer:roles": _make_performers("performer:roles"),
+    "performers:roles": _make_performers("performers:roles"),
+    "performersort": _make_performerssort("performersort"),
+    "performerssort": _make_performerssort("performerssort"),
+    "performersort:roles": _make_performerssort("performersort:roles"),
+    "performerssort:roles": _make_performerssort("performerssort:roles"),
+    "basename": _basename,
+    "dirname": _dirname,
+    "uri": _uri,
+    "format": _format,
+    "year": _year,
+    "#year": _num_year,
+    "originalyear": _originalyear,
+    "#originalyear": _num_originalyear,
+    "lyrics": _lyrics,
+    "filesize": _filesize,
+    "playlists": _playlists,
+}
@@ -9,6 +9,7 @@
 import os
 import re
 import sys
+import stat
 import errno
 import tempfile
 import urllib
@@ -114,30 +115,40 @@ else:
         assert isinstance(path, unicode)
         return path.encode(FSCODING, 'replace')
 
-    def glib2fsnative(path):
-        assert isinstance(path, bytes)
+    def _fsnative_noop(path):
+        # native, glib and serialized paths are all the same bytes on
+        # POSIX; one shared pass-through keeps the call sites uniform
+        # without a per-call isinstance check (asserts only fire
+        # without -O anyway)
         return path
 
-    def fsnative2glib(path):
-        assert isinstance(path, bytes)
-        return path
+    glib2fsnative = fsnative2glib = _fsnative_noop
 
     fsnative2bytes = fsnative2glib
 
     bytes2fsnative = glib2fsnative
 
 
+def _is_executable(path):
+    # one stat answers both the isfile and the access(X_OK) question,
+    # instead of two stat-family syscalls per candidate
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return stat.S_ISREG(st.st_mode) and st.st_mode & 0o111 != 0
+
+
 def iscommand(s):
     """True if an executable file 's' exists in the user's path, or is a
     fully-qualified existing executable file."""
 
     if s == "" or os.path.sep in s:
-        return os.path.isfile(s) and os.access(s, os.X_OK)
+        return _is_executable(s)
     else:
         s = s.split()[0]
         for p in os.defpath.split(os.path.pathsep):
-            p2 = os.path.join(p, s)
-            if os.path.isfile(p2) and os.access(p2, os.X_OK):
+            if _is_executable(os.path.join(p, s)):
                 return True
         else:
             return False
@@ -151,17 +162,16 @@ def listdir(path, hidden=False):
 
     assert is_fsnative(path)
 
-    if hidden:
-        filt = None
-    else:
-        filt = lambda base: not base.startswith(".")
+    names = os.listdir(path)
+    if not hidden:
+        # filter before sorting; hidden entries would be sorted for nothing
+        names = [name for name in names if not name.startswith(".")]
+    names.sort()
     if path.endswith(os.sep):
-        join = "".join
+        prefix = path
     else:
-        join = os.sep.join
-    return [join([path, basename])
-            for basename in sorted(os.listdir(path))
-            if filt(basename)]
+        prefix = path + os.sep
+    return [prefix + name for name in names]
 
 
 if os.name == "nt":
@@ -199,7 +209,13 @@ def escape_filename(s):
     if isinstance(s, unicode):
         s = s.encode("utf-8")
 
-    return fsnative(urllib.quote(s, safe="").decode("utf-8"))
+    # quote() output is pure ASCII, so decoding it to utf-8 just to have
+    # fsnative() encode it again was two wasted passes per name; quote
+    # itself already escapes via a cached per-byte table (Quoter)
+    escaped = urllib.quote(s, safe="")
+    if sys.platform == "win32":
+        return escaped.decode("ascii")
+    return escaped
 
 
 def unescape_filename(s):
@@ -209,18 +225,30 @@ def unescape_filename(s):
     return urllib.unquote(s).decode("utf-8")
 
 
-def expanduser(filename):
+def expanduser(filename, _cache={}):
     """needed because expanduser does not return wide character paths
     on windows even if a unicode path gets passed.
     """
 
+    try:
+        return _cache[filename]
+    except KeyError:
+        pass
+
+    expanded = None
     if os.name == "nt":
         profile = windows.get_profile_dir() or u""
         if filename == "~":
-            return profile
-        if filename.startswith(u"~" + os.path.sep):
-            return os.path.join(profile, filename[2:])
-    return os.path.expanduser(filename)
+            expanded = profile
+        elif filename.startswith(u"~" + os.path.sep):
+            expanded = os.path.join(profile, filename[2:])
+    if expanded is None:
+        expanded = os.path.expanduser(filename)
+
+    if len(_cache) > 500:
+        _cache.clear()
+    _cache[filename] = expanded
+    return expanded
 
 
 def unexpand(filename, HOME=expanduser("~")):
@@ -249,13 +277,13 @@ def pathname2url_win32(path):
     if isinstance(path, unicode):
         path = path.encode("utf-8")
 
-    quote = urllib.quote
-    if path[1:2] != ":" or path[:1] == "\\":
-        if path[:2] == "\\\\":
+    # one C-level replace instead of a split/join per path component
+    path = path.replace("\\", "/")
+    if path[1:2] != ":" or path[:1] == "/":
+        if path[:2] == "//":
             path = path[2:]
-        return quote("/".join(path.split("\\")))
-    drive, remain = path.split(":", 1)
-    return "/%s:%s" % (quote(drive), quote("/".join(remain.split("\\"))))
+        return urllib.quote(path)
+    return "/" + urllib.quote(path, safe="/:")
 
 if os.name == "nt":
     pathname2url = pathname2url_win32
@@ -317,21 +345,29 @@ def get_temp_cover_file(data):
         return fn
 
 
-def _strip_win32_incompat(string, BAD='\:*?;"<>|'):
-    """Strip Win32-incompatible characters from a Windows or Unix path."""
+# The set of bad characters only depends on the platform, so the
+# replacement tables are built once at import. str.translate walks the
+# string in C; unicode paths (Windows) use the equivalent ord -> u"_" map.
+_BAD_WIN32_CHARS = '\\:*?;"<>|' + ("/" if os.name == "nt" else "")
+_STRIP_TABLE = "".join(
+    "_" if chr(i) in _BAD_WIN32_CHARS else chr(i) for i in xrange(256))
+_STRIP_TABLE_UNICODE = dict((ord(c), u"_") for c in _BAD_WIN32_CHARS)
+_TRAIL_RE = re.compile(r'[\. ]$')
 
-    if os.name == "nt":
-        BAD += "/"
+
+def _strip_win32_incompat(string):
+    """Strip Win32-incompatible characters from a Windows or Unix path."""
 
     if not string:
         return string
 
-    new = "".join(map(lambda s: (s in BAD and "_") or s, string))
-    parts = new.split(os.sep)
-
-    def fix_end(string):
-        return re.sub(r'[\. ]$', "_", string)
-    return os.sep.join(map(fix_end, parts))
+    if isinstance(string, unicode):
+        new = string.translate(_STRIP_TABLE_UNICODE)
+    else:
+        new = string.translate(_STRIP_TABLE)
+    fix_end = _TRAIL_RE.sub
+    return os.sep.join(
+        fix_end("_", part) for part in new.split(os.sep))
 
 
 def strip_win32_incompat_from_path(string):
@@ -339,11 +375,34 @@ def strip_win32_incompat_from_path(string):
     and the drive part"""
 
     drive, tail = os.path.splitdrive(string)
-    tail = os.sep.join(map(_strip_win32_incompat, tail.split(os.sep)))
+    tail = os.sep.join(
+        _strip_win32_incompat(part) for part in tail.split(os.sep))
     return drive + tail
 
 
-def _normalize_darwin_path(filename, strict=False, _cache={}, _statcache={}):
+def _darwin_inode_map(parent, _listcache={}):
+    """Map (st_dev, st_ino) -> entry name for a directory.
+
+    One listdir + lstat pass per directory, shared by every path
+    normalized below it; unreadable entries are skipped.
+    """
+
+    if parent not in _listcache:
+        if len(_listcache) > 100:
+            _listcache.clear()
+        inodes = {}
+        for entry in os.listdir(parent):
+            try:
+                s = os.lstat(os.path.join(parent, entry))
+            except EnvironmentError:
+                continue
+            # keep the first entry per inode, like the old linear scan
+            inodes.setdefault((s.st_dev, s.st_ino), entry)
+        _listcache[parent] = inodes
+    return _listcache[parent]
+
+
+def _normalize_darwin_path(filename, strict=False, _cache={}):
     """Get a normalized version of the path by calling listdir
     and comparing the inodes with our file.
 
@@ -357,15 +416,6 @@ def _normalize_darwin_path(filename, strict=False, _cache={}, _statcache={}):
 
     filename = os.path.normpath(filename)
 
-    def _stat(p):
-        assert p.startswith("/")
-
-        if len(_statcache) > 100:
-            _statcache.clear()
-        if p not in _statcache:
-            _statcache[p] = os.lstat(p)
-        return _statcache[p]
-
     abspath = os.path.abspath(filename)
     key = (abspath, filename)
     if key in _cache:
@@ -373,15 +423,12 @@ def _normalize_darwin_path(filename, strict=False, _cache={}, _statcache={}):
     parent = os.path.dirname(abspath)
 
     try:
-        s1 = _stat(abspath)
-        for entry in os.listdir(parent):
-            entry_path = os.path.join(parent, entry)
-            if not os.path.samestat(s1, _stat(entry_path)):
-                continue
+        s1 = os.lstat(abspath)
+        entry = _darwin_inode_map(parent).get((s1.st_dev, s1.st_ino))
+        if entry is not None:
             dirname = os.path.dirname(filename)
             norm_dirname = _normalize_darwin_path(dirname)
             filename = os.path.join(norm_dirname, entry)
-            break
     except EnvironmentError:
         if strict:
             raise
@@ -393,15 +440,36 @@ def _normalize_darwin_path(filename, strict=False, _cache={}, _statcache={}):
     return filename
 
 
-def _normalize_path(filename, canonicalise=False):
+if os.name == "nt":
+    def _norm_case_path(filename):
+        # normpath already folds '/' into '\\', so all that is left of
+        # normcase here is the case fold
+        return os.path.normpath(filename).lower()
+else:
+    def _norm_case_path(filename):
+        # normcase is the identity on POSIX
+        return os.path.normpath(filename)
+
+
+def _normalize_path(filename, canonicalise=False, _cache={}):
     """Normalize a path on Windows / Linux
     If `canonicalise` is True, dereference symlinks etc
     by calling `os.path.realpath`
     """
+    key = (filename, canonicalise)
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+
     if canonicalise:
         filename = os.path.realpath(filename)
-    filename = os.path.normpath(filename)
-    return os.path.normcase(filename)
+    normalized = _norm_case_path(filename)
+
+    if len(_cache) > 4096:
+        _cache.clear()
+    _cache[key] = normalized
+    return normalized
 
 
 if sys.platform == "darwin":
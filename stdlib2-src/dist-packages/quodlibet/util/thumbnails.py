@@ -9,10 +9,26 @@ import os
 import tempfile
 import hashlib
 
+from collections import OrderedDict
+
+# the temp dir can't change during the process lifetime; don't re-probe
+# the TMPDIR/TEMP/TMP env vars per thumbnail request
+_TEMPDIR = tempfile.gettempdir()
+
+# usedforsecurity=False skips FIPS checks and can pick a faster MD5;
+# probe once since older Pythons don't know the keyword
+try:
+    hashlib.md5(b"", usedforsecurity=False)
+except TypeError:
+    _md5 = hashlib.md5
+else:
+    def _md5(data):
+        return hashlib.md5(data, usedforsecurity=False)
+
 from gi.repository import GdkPixbuf, GLib
 
 from quodlibet.const import USERDIR
-from quodlibet.util.path import mtime, mkdir, pathname2url, \
+from quodlibet.util.path import mkdir, pathname2url, \
     xdg_get_cache_home, is_fsnative
 
 
@@ -25,6 +41,21 @@ def add_border(pixbuf, val, round=False, width=1):
     Can not fail.
     """
 
+    if not round:
+        # without corner rounding every ring is plain border color, so
+        # draw the whole thing with one allocation and one copy instead
+        # of `width` incremental pixbufs each copying the full image
+        if not 0 <= val <= 255:
+            raise ValueError
+        c = (val << 24) | (val << 16) | (val << 8) | 0xFF
+        w, h = pixbuf.get_width(), pixbuf.get_height()
+        newpb = GdkPixbuf.Pixbuf.new(
+            GdkPixbuf.Colorspace.RGB, True, 8,
+            w + 2 * width, h + 2 * width)
+        newpb.fill(c)
+        pixbuf.copy_area(0, 0, w, h, newpb, width, width)
+        return newpb
+
     # XXX: borders don't overlap in all places
     # .. port to cairo?
     for i in range(width):
@@ -44,34 +75,55 @@ def _add_border(pixbuf, val, round=False):
     newpb.fill(c)
     pixbuf.copy_area(0, 0, w, h, newpb, 1, 1)
 
-    if round:
-        m = (c & 0xFFFFFF00) | 0xDD
-        p = (c & 0xFFFFFF00) | 0xBB
-        o = (c & 0xFFFFFF00) | 0x70
-        n = (c & 0xFFFFFF00) | 0x40
-        l = -1
-        e = -2
-
-        mask = (
-            (0, 0, n, p),
-            (0, o, m, l),
-            (n, m, e, e),
-            (p, l, e, e)
-        )
-
-        overlay = GdkPixbuf.Pixbuf.new(rgb, True, 8, 1, 1)
-        overlay.fill(m)
-
-        for y, row in enumerate(mask):
-            for x, pix in enumerate(row):
-                for xn, yn in [(x, y), (w + 1 - x, y), (w + 1 - x, h + 1 - y),
-                               (x, h + 1 - y)]:
-                    if pix == l:
-                        overlay.composite(newpb, xn, yn, 1, 1, 0, 0, 1, 1,
-                                          GdkPixbuf.InterpType.NEAREST, 70)
-                    elif pix != e:
-                        newpb.new_subpixbuf(xn, yn, 1, 1).fill(pix)
-    return newpb
+    if not round:
+        return newpb
+
+    # The corner overlay used to issue one new_subpixbuf/fill or
+    # composite call per pixel - dozens of GObject round trips per
+    # image. Patch the affected pixels in one copy of the pixel data
+    # instead and rebuild the pixbuf from that.
+    m = (c & 0xFFFFFF00) | 0xDD
+    p = (c & 0xFFFFFF00) | 0xBB
+    o = (c & 0xFFFFFF00) | 0x70
+    n = (c & 0xFFFFFF00) | 0x40
+    l = -1  # blend the border color over the pixel
+    e = -2  # leave the pixel untouched
+
+    mask = (
+        (0, 0, n, p),
+        (0, o, m, l),
+        (n, m, e, e),
+        (p, l, e, e)
+    )
+
+    buf = bytearray(newpb.get_pixels())
+    stride = newpb.get_rowstride()
+    # what composite() did: source alpha 0xDD scaled by overall alpha 70
+    ba = 0xDD * 70 // 255
+
+    for y, row in enumerate(mask):
+        for x, pix in enumerate(row):
+            for xn, yn in [(x, y), (w + 1 - x, y), (w + 1 - x, h + 1 - y),
+                           (x, h + 1 - y)]:
+                if pix == e:
+                    continue
+                off = yn * stride + xn * 4
+                if pix == l:
+                    dr, dg, db, da = buf[off:off + 4]
+                    rest = da * (255 - ba)
+                    outa = ba * 255 + rest
+                    buf[off] = (val * ba * 255 + dr * rest) // outa
+                    buf[off + 1] = (val * ba * 255 + dg * rest) // outa
+                    buf[off + 2] = (val * ba * 255 + db * rest) // outa
+                    buf[off + 3] = outa // 255
+                else:
+                    buf[off] = (pix >> 24) & 0xFF
+                    buf[off + 1] = (pix >> 16) & 0xFF
+                    buf[off + 2] = (pix >> 8) & 0xFF
+                    buf[off + 3] = pix & 0xFF
+
+    return GdkPixbuf.Pixbuf.new_from_bytes(
+        GLib.Bytes.new(bytes(buf)), rgb, True, 8, w + 2, h + 2, stride)
 
 
 def calc_scale_size(boundary, size, scale_up=True):
@@ -92,14 +144,13 @@ def calc_scale_size(boundary, size, scale_up=True):
     scale_w, scale_h = iwidth, iheight
 
     if iwidth > bwidth or iheight > bheight or scale_up:
-        bratio = float(bwidth) / bheight
-        iratio = float(iwidth) / iheight
-
-        if iratio > bratio:
+        # cross-multiplied integer compare; the two float ratio
+        # divisions are the only real work this function does
+        if iwidth * bheight > bwidth * iheight:
             scale_w = bwidth
-            scale_h = int(bwidth / iratio)
+            scale_h = bwidth * iheight // iwidth
         else:
-            scale_w = int(bheight * iratio)
+            scale_w = bheight * iwidth // iheight
             scale_h = bheight
 
     return scale_w, scale_h
@@ -129,12 +180,22 @@ def scale(pixbuf, boundary, scale_up=True, force_copy=False):
     return pixbuf.scale_simple(scale_w, scale_h, GdkPixbuf.InterpType.BILINEAR)
 
 
+_thumb_folder = None
+
+
 def get_thumbnail_folder():
     """Returns a path to the thumbnail folder.
 
     The returned path might not exist.
     """
 
+    # invariant for the process lifetime; the XDG/legacy fallback probes
+    # two directories per call, which used to run for every single
+    # thumbnail lookup during a scan
+    global _thumb_folder
+    if _thumb_folder is not None:
+        return _thumb_folder
+
     if os.name == "nt":
         thumb_folder = os.path.join(USERDIR, "thumbnails")
     else:
@@ -143,9 +204,42 @@ def get_thumbnail_folder():
         if os.path.exists(cache_folder) or not os.path.exists(thumb_folder):
             thumb_folder = cache_folder
 
+    _thumb_folder = thumb_folder
     return thumb_folder
 
 
+def _get_file_uri(path):
+    """Thumbnail-spec URI for a path, as ASCII bytes.
+
+    pathname2url already percent-escapes everything past ASCII, so the
+    result stays bytes from the utf-8 encode onward - no unicode
+    roundtrip before hashing it or writing it into the PNG metadata.
+    """
+
+    uri = "file://" + pathname2url(path)
+    if isinstance(uri, unicode):
+        uri = uri.encode("ascii")
+    return uri
+
+
+# The thumbnail name is a pure function of the path; during a library
+# scan the same covers get looked up over and over, so keep a bounded
+# LRU of path -> name instead of re-quoting and re-hashing each time.
+_thumb_names = OrderedDict()
+_MAX_THUMB_NAMES = 4096
+
+
+def _get_thumb_name(path):
+    try:
+        name = _thumb_names.pop(path)
+    except KeyError:
+        name = _md5(_get_file_uri(path)).hexdigest() + ".png"
+        if len(_thumb_names) >= _MAX_THUMB_NAMES:
+            _thumb_names.popitem(last=False)
+    _thumb_names[path] = name
+    return name
+
+
 def get_cache_info(path, boundary):
     """For an image at `path` return (cache_path, thumb_size)
 
@@ -167,9 +261,7 @@ def get_cache_info(path, boundary):
     thumb_folder = get_thumbnail_folder()
     cache_dir = os.path.join(thumb_folder, size_name)
 
-    uri = "file://" + pathname2url(path)
-    thumb_name = hashlib.md5(uri).hexdigest() + ".png"
-    thumb_path = os.path.join(cache_dir, thumb_name)
+    thumb_path = os.path.join(cache_dir, _get_thumb_name(path))
 
     return (thumb_path, thumb_size)
 
@@ -216,10 +308,19 @@ def get_thumbnail(path, boundary):
 
     width, height = boundary
 
+    # one stat yields both mtime and size; the old code went through
+    # os.stat up to four times per call
+    try:
+        st = os.stat(path)
+        path_mtime = st.st_mtime
+        path_size = st.st_size
+    except OSError:
+        path_mtime = 0
+
     # embedded thumbnails come from /tmp/
     # and too big thumbnails make no sense
-    if path.startswith(tempfile.gettempdir()) or \
-            width > 256 or height > 256 or mtime(path) == 0:
+    if path.startswith(_TEMPDIR) or \
+            width > 256 or height > 256 or path_mtime == 0:
         return GdkPixbuf.Pixbuf.new_from_file_at_size(path, width, height)
 
     thumb_path, thumb_size = get_cache_info(path, boundary)
@@ -244,7 +345,7 @@ def get_thumbnail(path, boundary):
                 except ValueError:
                     pass
 
-    if not pb or meta_mtime != int(mtime(path)):
+    if not pb or meta_mtime != int(path_mtime):
         pb = GdkPixbuf.Pixbuf.new_from_file(path)
 
         #Too small picture, no thumbnail needed
@@ -252,14 +353,14 @@ def get_thumbnail(path, boundary):
             return scale(pb, boundary)
 
         info = GdkPixbuf.Pixbuf.get_file_info(path)[0]
-        uri = "file://" + pathname2url(path)
+        uri = _get_file_uri(path)
         mime = info.get_mime_types()[0]
         options = {
             "tEXt::Thumb::Image::Width": str(pb.get_width()),
             "tEXt::Thumb::Image::Height": str(pb.get_height()),
             "tEXt::Thumb::URI": uri,
-            "tEXt::Thumb::MTime": str(int(mtime(path))),
-            "tEXt::Thumb::Size": str(os.path.getsize(path)),
+            "tEXt::Thumb::MTime": str(int(path_mtime)),
+            "tEXt::Thumb::Size": str(path_size),
             "tEXt::Thumb::Mimetype": mime,
             "tEXt::Software": "QuodLibet"
         }
@@ -271,4 +372,9 @@ def get_thumbnail(path, boundary):
         except OSError:
             pass
 
+    # common case: the cached thumb already has the requested size
+    # (thumbnailers usually ask for exactly 128x128/256x256), so skip
+    # the scale() round trip entirely
+    if (pb.get_width(), pb.get_height()) == (width, height):
+        return pb
     return scale(pb, boundary)